@@ -7,30 +7,54 @@ import discord
 from discord.ext import tasks
 from discord import app_commands
 import aiohttp
+from aiohttp import web
+import aiosqlite
+import asyncio
 import os
-import json
+import re
+import orjson
 import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
 from dotenv import load_dotenv
-from flask import Flask
-from threading import Thread
-from datetime import datetime, timedelta
+from datetime import datetime
+from zoneinfo import ZoneInfo
+from functools import lru_cache
+from collections.abc import Awaitable, Callable
 from timezonefinder import TimezoneFinder
-import pytz
 import math
+import time
+import msgspec
+from cachetools import TTLCache
+from aiolimiter import AsyncLimiter
+import numpy as np
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 
+# libuv-backed event loop where available (not on Windows); plain asyncio otherwise
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
 # ========================
 # LOGGING CONFIGURATION
 # ========================
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('bot.log'),
-        logging.StreamHandler()
-    ]
-)
+log_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+log_handlers = [
+    logging.FileHandler('bot.log'),
+    logging.StreamHandler()
+]
+for handler in log_handlers:
+    handler.setFormatter(log_formatter)
+
+# The event loop only enqueues records; a listener thread does the file and console writes
+log_queue: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+log_listener = QueueListener(log_queue, *log_handlers, respect_handler_level=True)
+logging.root.setLevel(logging.INFO)
+logging.root.addHandler(QueueHandler(log_queue))
+log_listener.start()
+
 logger = logging.getLogger('CirrusUncinus')
 
 # ========================
@@ -52,19 +76,65 @@ VAPOR_PRESSURE_BASE = 6.112  # hPa
 VAPOR_PRESSURE_COEFF = 17.67
 VAPOR_PRESSURE_TEMP_BASE = 243.5  # °C
 GAS_CONSTANT_DRY_AIR = 287.05  # J/(kg·K)
+INV_GAS_CONSTANT_DRY_AIR = 1.0 / GAS_CONSTANT_DRY_AIR
 STANDARD_PRESSURE = 1013.25  # hPa
 KELVIN_OFFSET = 273.15
 
 # Cache settings
 CACHE_TTL_MINUTES = 5
-WEATHER_CACHE_TTL = timedelta(minutes=CACHE_TTL_MINUTES)
-NASA_CACHE_TTL = timedelta(hours=12)
+WEATHER_CACHE_TTL_SECONDS = CACHE_TTL_MINUTES * 60
+WEATHER_CACHE_SIZE = 1024
+NASA_CACHE_TTL_SECONDS = 24 * 60 * 60
+# NASA rolls the APOD over at midnight US Eastern
+APOD_TIMEZONE = "America/New_York"
+# How long a not-yet-updated APOD is reused before asking NASA again
+APOD_PENDING_TTL_SECONDS = 10 * 60
+# Well past the daily report interval so DST shifts and send jitter still hit
+USER_CACHE_TTL_SECONDS = 7 * 24 * 60 * 60
+USER_CACHE_SIZE = 4096
+
+# Discord embeds
+REPORT_COLOR = 0x2980B9
+NASA_COLOR = 0x1C1C3C
+APOD_DESCRIPTION_LENGTH = 500
+EMBED_TOTAL_LIMIT = 6000  # characters across all embeds in one message
+
+# Shared HTTP connection pool
+HTTP_POOL_SIZE = 50
+HTTP_DNS_CACHE_SECONDS = 300
+HTTP_KEEPALIVE_SECONDS = 75
+HTTP_TIMEOUT_SECONDS = 10
+
+# City name input
+MAX_CITY_LENGTH = 100
+CITY_WHITESPACE = re.compile(r"\s+")
 
 # Rate limiting
 COMMAND_COOLDOWN_SECONDS = 30
 
-# Database file
-DB_FILE = "user_settings.json"
+# Daily reports delivered concurrently per scheduled run
+REPORT_CONCURRENCY = 20
+# Report REST calls per second across all runs, kept under Discord's 50 req/s global limit.
+# A recipient can cost up to three: user fetch, DM channel open, message send.
+DM_RATE_LIMIT = 45
+# How late a report job may still run (e.g. after an event-loop stall)
+REPORT_MISFIRE_GRACE_SECONDS = 300
+# Delivery attempts per report on network errors, with linear backoff
+REPORT_SEND_ATTEMPTS = 3
+REPORT_RETRY_DELAY_SECONDS = 2
+
+# Keep-alive web server
+WEB_HOST = "0.0.0.0"
+WEB_PORT = 8080
+
+# Database files
+DB_FILE = "user_settings.db"
+LEGACY_SETTINGS_FILE = "user_settings.json"
+
+# Settings write batching
+FLUSH_INTERVAL_SECONDS = 0.2
+FLUSH_BATCH_SIZE = 64
+FLUSH_RETRY_DELAY_SECONDS = 5
 
 # ========================
 # BOT SETUP
@@ -77,41 +147,235 @@ tree = app_commands.CommandTree(bot)
 # ========================
 # DATA STRUCTURES & CACHE
 # ========================
-user_settings: dict[int, dict] = {}
-weather_cache: dict[str, tuple[dict, datetime]] = {}
-nasa_cache: tuple[tuple[str, str, str], datetime] | None = None
+class Weather(msgspec.Struct):
+    """Current conditions extracted from an OpenWeather response"""
+    temp: float
+    feels_like: float
+    pressure: int
+    humidity: int
+    clouds: int
+    wind_speed: float
+    wind_deg: int
+    visibility: int
+    description: str
+    condition_id: int
+    lat: float
+    lon: float
+    city_name: str
+    country: str
+
+# OpenWeather response, reduced to the fields get_weather uses.
+# Undeclared keys (rain, snow, timezone, ...) are skipped while decoding.
+class OWMCoord(msgspec.Struct):
+    lat: float
+    lon: float
+
+class OWMCondition(msgspec.Struct):
+    id: int
+    description: str
+
+class OWMMain(msgspec.Struct):
+    temp: float
+    feels_like: float
+    pressure: int
+    humidity: int
+
+class OWMWind(msgspec.Struct):
+    speed: float
+    deg: int = 0
+
+class OWMClouds(msgspec.Struct):
+    all: int
+
+class OWMSys(msgspec.Struct):
+    country: str
+
+class OWMResponse(msgspec.Struct):
+    coord: OWMCoord
+    weather: list[OWMCondition]
+    main: OWMMain
+    wind: OWMWind
+    clouds: OWMClouds
+    sys: OWMSys
+    name: str
+    visibility: int = 10000
+
+OWM_DECODER = msgspec.json.Decoder(OWMResponse)
+
+class Apod(msgspec.Struct):
+    """Fields used from the NASA APOD response"""
+    url: str
+    title: str = "NASA Sky Image"
+    explanation: str = ""
+    date: str = ""
+
+APOD_DECODER = msgspec.json.Decoder(Apod)
+
+class Station(msgspec.Struct):
+    """A user's observation station and preferences (one users table row)"""
+    city: str
+    country: str
+    lat: float
+    lon: float
+    tz: str
+    temp_unit: str = "celsius"
+    report_hour: int = 8
+
+user_settings: dict[int, Station] = {}
+# Expiry is tracked as monotonic float deadlines, immune to wall-clock changes
+weather_cache: TTLCache[str, Weather] = TTLCache(maxsize=WEATHER_CACHE_SIZE, ttl=WEATHER_CACHE_TTL_SECONDS, timer=time.monotonic)
+nasa_cache: TTLCache[str, tuple[str, str, str]] = TTLCache(maxsize=1, ttl=NASA_CACHE_TTL_SECONDS, timer=time.monotonic)
+# Previous day's APOD while today's isn't published yet, kept only briefly
+pending_apod_cache: TTLCache[str, tuple[str, str, str]] = TTLCache(maxsize=1, ttl=APOD_PENDING_TTL_SECONDS, timer=time.monotonic)
+# Report recipients fetched over REST because the gateway cache didn't have them
+user_cache: TTLCache[int, discord.User] = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL_SECONDS, timer=time.monotonic)
+# Upstream requests in progress, shared by concurrent callers with the same key
+inflight_requests: dict[str, asyncio.Future] = {}
+http_session: aiohttp.ClientSession | None = None
+db: aiosqlite.Connection | None = None
+# Timezone polygons are loaded once instead of on every lookup
+timezone_finder = TimezoneFinder(in_memory=True)
+dirty_users: set[int] = set()
+flush_event = asyncio.Event()
+flush_task: asyncio.Task | None = None
 
 # ========================
 # DATABASE FUNCTIONS
 # ========================
 
-def load_user_settings() -> None:
-    """Load user settings from JSON file"""
-    global user_settings
+# Column order matches the Station field order
+SETTINGS_COLUMNS = Station.__struct_fields__
+
+UPSERT_USER_SQL = (
+    "INSERT INTO users (id, city, country, lat, lon, tz, temp_unit, report_hour) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+    "ON CONFLICT(id) DO UPDATE SET "
+    "city = excluded.city, country = excluded.country, lat = excluded.lat, lon = excluded.lon, "
+    "tz = excluded.tz, temp_unit = excluded.temp_unit, report_hour = excluded.report_hour"
+)
+
+def settings_row(user_id: int, settings: Station) -> tuple:
+    """Flatten a station record into a users table row"""
+    return (user_id, *msgspec.structs.astuple(settings))
+
+async def load_user_settings() -> None:
+    """Open the SQLite database and load all user settings into memory"""
+    global db, user_settings
     try:
-        if os.path.exists(DB_FILE):
-            with open(DB_FILE, 'r') as f:
-                # Convert string keys back to int
-                data = json.load(f)
-                user_settings = {int(k): v for k, v in data.items()}
-            logger.info(f"Loaded {len(user_settings)} user settings from database")
-        else:
-            user_settings = {}
-            logger.info("No existing database found, starting fresh")
+        if db is None:
+            db = await aiosqlite.connect(DB_FILE)
+            await db.execute("PRAGMA journal_mode=WAL")
+            await db.execute("PRAGMA synchronous=NORMAL")
+            await db.execute(
+                "CREATE TABLE IF NOT EXISTS users ("
+                "id INTEGER PRIMARY KEY, city TEXT, country TEXT, lat REAL, lon REAL, "
+                "tz TEXT, temp_unit TEXT, report_hour INT)"
+            )
+            await import_legacy_settings()
+
+        rows = await db.execute_fetchall(f"SELECT id, {', '.join(SETTINGS_COLUMNS)} FROM users")
+        user_settings = {row[0]: Station(*row[1:]) for row in rows}
+        logger.info(f"Loaded {len(user_settings)} user settings from database")
     except Exception as e:
         logger.error(f"Error loading user settings: {e}")
         user_settings = {}
 
-def save_user_settings() -> None:
-    """Save user settings to JSON file"""
+async def import_legacy_settings() -> None:
+    """One-time migration of the old JSON settings file into SQLite"""
+    if not os.path.exists(LEGACY_SETTINGS_FILE):
+        return
+
+    async with db.execute("SELECT COUNT(*) FROM users") as cursor:
+        (count,) = await cursor.fetchone()
+    if count:
+        return
+
+    with open(LEGACY_SETTINGS_FILE, 'rb') as f:
+        data = orjson.loads(f.read())
+
+    # Legacy records are plain dicts, possibly missing the newer preference keys
+    await db.executemany(
+        UPSERT_USER_SQL,
+        [settings_row(int(k), msgspec.convert(v, Station)) for k, v in data.items()]
+    )
+    await db.commit()
+    logger.info(f"Imported {len(data)} user settings from {LEGACY_SETTINGS_FILE}")
+
+def mark_dirty(user_id: int) -> None:
+    """Queue a user's settings row for the next batched write"""
+    dirty_users.add(user_id)
+    flush_event.set()
+
+async def flush_user_settings() -> None:
+    """Write all dirty settings rows in a single transaction"""
+    if not dirty_users or db is None:
+        return
+
+    batch = list(dirty_users)
+    dirty_users.clear()
     try:
-        # Convert int keys to string for JSON
-        data = {str(k): v for k, v in user_settings.items()}
-        with open(DB_FILE, 'w') as f:
-            json.dump(data, f, indent=2)
-        logger.info(f"Saved {len(user_settings)} user settings to database")
+        await db.executemany(
+            UPSERT_USER_SQL,
+            [settings_row(uid, user_settings[uid]) for uid in batch if uid in user_settings]
+        )
+        await db.commit()
+        logger.info(f"Saved settings for {len(batch)} user(s)")
+    except asyncio.CancelledError:
+        # Interrupted by shutdown; the final flush writes these rows again
+        dirty_users.update(batch)
+        raise
     except Exception as e:
         logger.error(f"Error saving user settings: {e}")
+        try:
+            await db.rollback()
+        except Exception as rollback_error:
+            logger.error(f"Error rolling back settings write: {rollback_error}")
+        # Keep the rows dirty and wake the flusher again shortly to retry them
+        dirty_users.update(batch)
+        asyncio.get_running_loop().call_later(FLUSH_RETRY_DELAY_SECONDS, flush_event.set)
+
+async def settings_flusher() -> None:
+    """Background task coalescing settings writes into batched commits"""
+    loop = asyncio.get_running_loop()
+    while True:
+        await flush_event.wait()
+        flush_event.clear()
+
+        # Keep collecting writes until the window closes or the batch is full
+        deadline = loop.time() + FLUSH_INTERVAL_SECONDS
+        while len(dirty_users) < FLUSH_BATCH_SIZE:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                await asyncio.wait_for(flush_event.wait(), remaining)
+            except asyncio.TimeoutError:
+                break
+            flush_event.clear()
+
+        # The flusher must outlive any single failed write, or later changes are never saved
+        try:
+            await flush_user_settings()
+        except Exception:
+            logger.exception("Unexpected error in settings flusher")
+
+async def close_database() -> None:
+    """Flush pending writes and close the SQLite connection"""
+    global db, flush_task
+    if flush_task is not None:
+        flush_task.cancel()
+        try:
+            await flush_task
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            # Still run the final flush and close below
+            logger.error(f"Settings flusher had failed: {e}")
+        flush_task = None
+    if db is not None:
+        await flush_user_settings()
+        await db.close()
+        db = None
 
 # ========================
 # METEOROLOGICAL CALCULATIONS
@@ -144,13 +408,12 @@ def calculate_heat_index(temp_c: float, humidity: float) -> float:
         if temp_f < 80:
             return temp_c
         
-        hi = -42.379 + 2.04901523 * temp_f + 10.14333127 * humidity
-        hi -= 0.22475541 * temp_f * humidity
-        hi -= 0.00683783 * temp_f * temp_f
-        hi -= 0.05481717 * humidity * humidity
-        hi += 0.00122874 * temp_f * temp_f * humidity
-        hi += 0.00085282 * temp_f * humidity * humidity
-        hi -= 0.00000199 * temp_f * temp_f * humidity * humidity
+        # Rothfusz polynomial factored around T*RH to minimize multiplies
+        th = temp_f * humidity
+        hi = (-42.379
+              + temp_f * (2.04901523 - 0.00683783 * temp_f)
+              + humidity * (10.14333127 - 0.05481717 * humidity)
+              + th * (-0.22475541 + 0.00122874 * temp_f + 0.00085282 * humidity - 0.00000199 * th))
         
         hi_c = (hi - 32) * 5/9
         return round(hi_c, 2)
@@ -164,38 +427,36 @@ def calculate_air_density(temp_c: float, pressure_hpa: float, humidity: float) -
     Returns: Density in kg/m³
     """
     try:
-        temp_k = temp_c + KELVIN_OFFSET
-        
-        es = VAPOR_PRESSURE_BASE * math.exp((VAPOR_PRESSURE_COEFF * temp_c) / (temp_c + VAPOR_PRESSURE_TEMP_BASE))
-        e = (humidity / 100.0) * es
-        pd = (pressure_hpa * 100) - (e * 100)
-        density = (pd / (GAS_CONSTANT_DRY_AIR * temp_k))
-        
+        # Dry-air partial pressure in Pa: p - e, with e = (RH/100) * es * 100 = RH * es
+        density = (
+            (pressure_hpa * 100 - humidity * VAPOR_PRESSURE_BASE * math.exp(VAPOR_PRESSURE_COEFF * temp_c / (temp_c + VAPOR_PRESSURE_TEMP_BASE)))
+            * INV_GAS_CONSTANT_DRY_AIR / (temp_c + KELVIN_OFFSET)
+        )
         return round(density, 4)
     except Exception as e:
         logger.error(f"Air density calculation error: {e}")
         return 1.225
 
+# WMO okta scale, indexed by oktas
+CLOUD_CLASSIFICATIONS: tuple[tuple[str, str, int], ...] = (
+    ("SKC", "Sky Clear - No cloud coverage detected", 0),
+    ("FEW", "Few clouds - Cumulus humilis or fractus", 1),
+    ("FEW", "Few clouds - Isolated cumulus development", 2),
+    ("SCT", "Scattered - Cumulus mediocris formation", 3),
+    ("SCT", "Scattered - Multiple cumulus or stratocumulus", 4),
+    ("BKN", "Broken - Extensive stratocumulus or altocumulus", 5),
+    ("BKN", "Broken - Altostratus or nimbostratus forming", 6),
+    ("BKN", "Broken - Pre-overcast conditions", 7),
+    ("OVC", "Overcast - Complete cloud coverage (nimbostratus/stratus)", 8),
+)
+
 def classify_clouds_scientific(cloud_pct: float) -> tuple[str, str, int]:
     """
     Classify clouds using WMO okta scale and scientific nomenclature
     Returns: (classification, description, oktas)
     """
-    oktas = round(cloud_pct / 12.5)
-    
-    classifications = {
-        0: ("SKC", "Sky Clear - No cloud coverage detected", 0),
-        1: ("FEW", "Few clouds - Cumulus humilis or fractus", 1),
-        2: ("FEW", "Few clouds - Isolated cumulus development", 2),
-        3: ("SCT", "Scattered - Cumulus mediocris formation", 3),
-        4: ("SCT", "Scattered - Multiple cumulus or stratocumulus", 4),
-        5: ("BKN", "Broken - Extensive stratocumulus or altocumulus", 5),
-        6: ("BKN", "Broken - Altostratus or nimbostratus forming", 6),
-        7: ("BKN", "Broken - Pre-overcast conditions", 7),
-        8: ("OVC", "Overcast - Complete cloud coverage (nimbostratus/stratus)", 8),
-    }
-    
-    return classifications.get(oktas, classifications[8])
+    oktas = min(8, max(0, round(cloud_pct / 12.5)))
+    return CLOUD_CLASSIFICATIONS[oktas]
 
 def calculate_cloud_base_height(temp_c: float, dewpoint: float) -> int:
     """
@@ -210,6 +471,44 @@ def calculate_cloud_base_height(temp_c: float, dewpoint: float) -> int:
     except Exception:
         return 0
 
+def calculate_derived_batch(temp_c: np.ndarray, humidity: np.ndarray, pressure_hpa: np.ndarray) -> dict[str, np.ndarray]:
+    """
+    Vectorized dewpoint, heat index, air density and cloud base for many observations
+    Mirrors the scalar helpers above, including their rounding and fallbacks
+    Returns: Dict of arrays keyed by quantity
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Magnus-Tetens dewpoint
+        alpha = (VAPOR_PRESSURE_COEFF * temp_c) / (VAPOR_PRESSURE_TEMP_BASE + temp_c) + np.log(humidity / 100.0)
+        dewpoint = (VAPOR_PRESSURE_TEMP_BASE * alpha) / (VAPOR_PRESSURE_COEFF - alpha)
+        dewpoint = np.round(np.where(np.isfinite(dewpoint), dewpoint, 0.0), 2)
+
+        # Rothfusz regression, only applied at or above 80°F
+        temp_f = (temp_c * 9/5) + 32
+        th = temp_f * humidity
+        hi = (-42.379
+              + temp_f * (2.04901523 - 0.00683783 * temp_f)
+              + humidity * (10.14333127 - 0.05481717 * humidity)
+              + th * (-0.22475541 + 0.00122874 * temp_f + 0.00085282 * humidity - 0.00000199 * th))
+        heat_index = np.where(temp_f < 80, temp_c, np.round((hi - 32) * 5/9, 2))
+
+        # Ideal gas law with humidity correction
+        air_density = np.round(
+            (pressure_hpa * 100 - humidity * VAPOR_PRESSURE_BASE * np.exp(VAPOR_PRESSURE_COEFF * temp_c / (temp_c + VAPOR_PRESSURE_TEMP_BASE)))
+            * INV_GAS_CONSTANT_DRY_AIR / (temp_c + KELVIN_OFFSET),
+            4
+        )
+
+    # Hennig cloud base, truncated like int()
+    cloud_base = (125 * (temp_c - dewpoint)).astype(int)
+
+    return {
+        "dewpoint": dewpoint,
+        "heat_index": heat_index,
+        "air_density": air_density,
+        "cloud_base": cloud_base,
+    }
+
 def get_visibility_category(vis_m: int) -> str:
     """Categorize visibility based on WMO standards"""
     if vis_m >= 10000:
@@ -223,57 +522,125 @@ def get_visibility_category(vis_m: int) -> str:
     else:
         return f"Very Poor ({vis_m}m)"
 
+# Display unit -> (converter from Celsius, symbol)
+TEMPERATURE_CONVERTERS: dict[str, tuple[Callable[[float], float], str]] = {
+    "celsius": (lambda temp_c: round(temp_c, 1), "°C"),
+    "fahrenheit": (lambda temp_c: round((temp_c * 9/5) + 32, 1), "°F"),
+    "kelvin": (lambda temp_c: round(temp_c + KELVIN_OFFSET, 1), "K"),
+}
+
+def temperature_converter(unit: str) -> tuple[Callable[[float], float], str]:
+    """Pick the converter for a unit once, falling back to Celsius"""
+    return TEMPERATURE_CONVERTERS.get(unit, TEMPERATURE_CONVERTERS["celsius"])
+
 def convert_temperature(temp_c: float, unit: str) -> tuple[float, str]:
     """Convert temperature to specified unit"""
-    if unit == "fahrenheit":
-        return round((temp_c * 9/5) + 32, 1), "°F"
-    elif unit == "kelvin":
-        return round(temp_c + KELVIN_OFFSET, 1), "K"
-    else:  # celsius
-        return round(temp_c, 1), "°C"
+    convert, symbol = temperature_converter(unit)
+    return convert(temp_c), symbol
 
 # ========================
 # API FUNCTIONS WITH CACHING
 # ========================
 
-async def get_weather(city: str) -> dict | None:
-    """Fetch comprehensive meteorological data from OpenWeather API with caching"""
-    cache_key = city.lower()
-    now = datetime.now()
+def get_http_session() -> aiohttp.ClientSession:
+    """Return the shared HTTP session, creating it on first use"""
+    global http_session
+    if http_session is None or http_session.closed:
+        # Pool sized above REPORT_CONCURRENCY so a report burst reuses warm connections
+        http_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=HTTP_POOL_SIZE,
+                ttl_dns_cache=HTTP_DNS_CACHE_SECONDS,
+                keepalive_timeout=HTTP_KEEPALIVE_SECONDS
+            ),
+            timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT_SECONDS)
+        )
+    return http_session
+
+async def close_http_session() -> None:
+    """Close the shared HTTP session"""
+    global http_session
+    if http_session is not None and not http_session.closed:
+        await http_session.close()
+    http_session = None
+
+async def fetch_bytes(url: str) -> bytes:
+    """GET a URL on the shared session and return the raw response body"""
+    async with get_http_session().get(url) as response:
+        response.raise_for_status()
+        return await response.read()
+
+def normalize_city(city: str) -> str:
+    """Canonical cache key for a city query: trimmed, single-spaced, lowercase"""
+    return CITY_WHITESPACE.sub(" ", city.strip()).lower()
+
+async def single_flight(key: str, fetch: Callable[[], Awaitable]):
+    """Run fetch() once for all concurrent callers sharing a key"""
+    if (pending := inflight_requests.get(key)) is not None:
+        logger.debug(f"Joining in-flight request: {key}")
+        return await asyncio.shield(pending)
     
-    # Check cache
-    if cache_key in weather_cache:
-        cached_data, timestamp = weather_cache[cache_key]
-        if now - timestamp < WEATHER_CACHE_TTL:
-            logger.debug(f"Cache hit for {city}")
-            return cached_data
+    future = asyncio.get_running_loop().create_future()
+    inflight_requests[key] = future
+    try:
+        result = await fetch()
+        future.set_result(result)
+        return result
+    finally:
+        del inflight_requests[key]
+        if not future.done():
+            # Cancelled mid-fetch; waiters see the same failure value as an API error
+            future.set_result(None)
+
+async def get_weather(city: str, country: str | None = None) -> Weather | None:
+    """
+    Fetch comprehensive meteorological data from OpenWeather API with caching
+    Pass the country code to pin a configured station, e.g. London, GB vs London, CA
+    """
+    cache_key = normalize_city(f"{city},{country}" if country else city)
+    if not 1 <= len(cache_key) <= MAX_CITY_LENGTH:
+        return None
+    
+    # Check cache (expired entries are evicted on access)
+    if (cached_data := weather_cache.get(cache_key)) is not None:
+        logger.debug(f"Cache hit for {cache_key}")
+        return cached_data
     
-    # Fetch new data
+    async def fetch() -> Weather | None:
+        result = await fetch_weather(cache_key)
+        if result is not None:
+            weather_cache[cache_key] = result
+            # Also file it under the resolved station, which is what stored settings query
+            weather_cache[normalize_city(f"{result.city_name},{result.country}")] = result
+        return result
+    
+    return await single_flight(f"weather:{cache_key}", fetch)
+
+async def fetch_weather(city: str) -> Weather | None:
+    """Request current conditions for a city from the OpenWeather API"""
     try:
         url = f"https://api.openweathermap.org/data/2.5/weather?q={city}&appid={OPENWEATHER_API_KEY}&units=metric"
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, timeout=aiohttp.ClientTimeout(total=10)) as response:
-                response.raise_for_status()
-                data = await response.json()
-        
-        result = {
-            "temp": data["main"]["temp"],
-            "feels_like": data["main"]["feels_like"],
-            "pressure": data["main"]["pressure"],
-            "humidity": data["main"]["humidity"],
-            "clouds": data["clouds"]["all"],
-            "wind_speed": data["wind"]["speed"],
-            "wind_deg": data["wind"].get("deg", 0),
-            "visibility": data.get("visibility", 10000),
-            "description": data["weather"][0]["description"],
-            "condition_id": data["weather"][0]["id"],
-            "lat": data["coord"]["lat"],
-            "lon": data["coord"]["lon"],
-            "city_name": data["name"],
-            "country": data["sys"]["country"],
-        }
-        
-        weather_cache[cache_key] = (result, now)
+        data = OWM_DECODER.decode(await fetch_bytes(url))
+        condition = data.weather[0]
+        
+        result = Weather(
+            temp=data.main.temp,
+            feels_like=data.main.feels_like,
+            pressure=data.main.pressure,
+            humidity=data.main.humidity,
+            clouds=data.clouds.all,
+            wind_speed=data.wind.speed,
+            wind_deg=data.wind.deg,
+            visibility=data.visibility,
+            # Capitalised once here; cached readings are shown as-is
+            description=condition.description.capitalize(),
+            condition_id=condition.id,
+            lat=data.coord.lat,
+            lon=data.coord.lon,
+            city_name=data.name,
+            country=data.sys.country,
+        )
+        
         logger.info(f"Fetched weather data for {city}")
         return result
         
@@ -281,79 +648,114 @@ async def get_weather(city: str) -> dict | None:
         logger.error(f"Weather API error for {city}: {e}")
         return None
 
+@lru_cache(maxsize=4096)
+def _timezone_at(lat: float, lon: float) -> str:
+    return timezone_finder.timezone_at(lat=lat, lng=lon) or "UTC"
+
 def get_timezone_from_coords(lat: float, lon: float) -> str:
     """Determine timezone from geographic coordinates"""
     try:
-        tf = TimezoneFinder()
-        tz_str = tf.timezone_at(lat=lat, lng=lon)
-        return tz_str if tz_str else "UTC"
+        # Quantize to ~11m so repeat lookups for a station hit the cache
+        return _timezone_at(round(lat, 4), round(lon, 4))
     except Exception as e:
         logger.error(f"Timezone calculation error: {e}")
         return "UTC"
 
+def get_tz(tz_str: str) -> ZoneInfo:
+    """Resolve a timezone name (ZoneInfo caches parsed zones itself)"""
+    return ZoneInfo(tz_str)
+
 def get_local_time(tz_str: str) -> str:
     """Calculate local time for given timezone"""
     try:
-        tz = pytz.timezone(tz_str)
+        tz = get_tz(tz_str)
         local_time = datetime.now(tz)
         return local_time.strftime("%Y-%m-%d %H:%M:%S %Z")
     except Exception as e:
         logger.error(f"Time calculation error: {e}")
         return "Unknown"
 
+def apod_day() -> str:
+    """Date of the APOD entry currently being published"""
+    return datetime.now(get_tz(APOD_TIMEZONE)).date().isoformat()
+
 async def get_nasa_image() -> tuple[str, str, str] | None:
-    """Retrieve NASA Astronomy Picture of the Day with caching"""
-    global nasa_cache
-    now = datetime.now()
+    """Retrieve NASA Astronomy Picture of the Day, fetched once per APOD day"""
+    day = apod_day()
+    if (cached_data := nasa_cache.get(day) or pending_apod_cache.get(day)) is not None:
+        logger.debug("NASA cache hit")
+        return cached_data
     
-    # Check cache
-    if nasa_cache is not None:
-        cached_data, timestamp = nasa_cache
-        if now - timestamp < NASA_CACHE_TTL:
-            logger.debug("NASA cache hit")
-            return cached_data
-    
-    # Fetch new data
+    return await single_flight(f"apod:{day}", lambda: fetch_nasa_image(day))
+
+async def fetch_nasa_image(day: str) -> tuple[str, str, str] | None:
+    """Request the current APOD entry from the NASA API"""
     try:
         url = f"https://api.nasa.gov/planetary/apod?api_key={NASA_API_KEY}"
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, timeout=aiohttp.ClientTimeout(total=10)) as response:
-                response.raise_for_status()
-                data = await response.json()
-        
-        result = (data["url"], data.get("title", "NASA Sky Image"), data.get("explanation", ""))
-        nasa_cache = (result, now)
-        logger.info("Fetched NASA APOD")
+        apod = APOD_DECODER.decode(await fetch_bytes(url))
+        
+        # Shortened once here so every embed reuses the cached text
+        explanation = (
+            f"{apod.explanation[:APOD_DESCRIPTION_LENGTH]}..."
+            if len(apod.explanation) > APOD_DESCRIPTION_LENGTH
+            else apod.explanation
+        )
+        result = (apod.url, apod.title, explanation)
+        if apod.date == day:
+            nasa_cache[day] = result
+            logger.info("Fetched NASA APOD")
+        else:
+            # NASA hasn't rolled over yet; don't pin the old entry for the whole day
+            pending_apod_cache[day] = result
+            logger.info(f"NASA APOD for {day} not published yet, serving {apod.date or 'previous entry'}")
         return result
         
     except Exception as e:
         logger.error(f"NASA API error: {e}")
         return None
 
+CARDINAL_DIRECTIONS = ("N", "NNE", "NE", "ENE", "E", "ESE", "SE", "SSE",
+                       "S", "SSW", "SW", "WSW", "W", "WNW", "NW", "NNW")
+
 def cardinal_direction(degrees: float) -> str:
     """Convert wind direction from degrees to cardinal direction"""
-    directions = ["N", "NNE", "NE", "ENE", "E", "ESE", "SE", "SSE",
-                  "S", "SSW", "SW", "WSW", "W", "WNW", "NW", "NNW"]
-    idx = round(degrees / 22.5) % 16
-    return directions[idx]
+    return CARDINAL_DIRECTIONS[int(degrees * 16 / 360 + 0.5) & 15]
 
 # ========================
 # WEB SERVER (Keep-Alive for some hosting services)
 # ========================
-app = Flask("")
+web_runner: web.AppRunner | None = None
 
-@app.route("/")
-def home():
-    return "Atmospheric Monitoring System Online"
+async def home(request: web.Request) -> web.Response:
+    return web.Response(text="Atmospheric Monitoring System Online")
 
-@app.route("/health")
-def health():
-    return {"status": "healthy", "users": len(user_settings)}
+async def health(request: web.Request) -> web.Response:
+    return web.json_response({"status": "healthy", "users": len(user_settings)})
 
-def run_web_server():
-    app.run(host="0.0.0.0", port=8080)
+async def start_web_server() -> None:
+    """Serve the keep-alive endpoints on the bot's event loop"""
+    global web_runner
+    app = web.Application()
+    app.router.add_get("/", home)
+    app.router.add_get("/health", health)
+    web_runner = web.AppRunner(app, access_log=None)
+    await web_runner.setup()
+    try:
+        await web.TCPSite(web_runner, WEB_HOST, WEB_PORT).start()
+    except OSError as e:
+        # Keep-alive endpoint is optional; the bot runs without it
+        logger.error(f"Web server could not bind {WEB_HOST}:{WEB_PORT}: {e}")
+        await web_runner.cleanup()
+        web_runner = None
+        return
+    logger.info(f"Web server listening on {WEB_HOST}:{WEB_PORT}")
 
-Thread(target=run_web_server, daemon=True).start()
+async def stop_web_server() -> None:
+    """Shut down the keep-alive web server"""
+    global web_runner
+    if web_runner is not None:
+        await web_runner.cleanup()
+        web_runner = None
 
 # ========================
 # SLASH COMMANDS
@@ -377,8 +779,8 @@ async def ping(interaction: discord.Interaction):
 async def setlocation(interaction: discord.Interaction, city: str):
     try:
         # Validate input
-        city = city.strip()
-        if len(city) == 0 or len(city) > 100:
+        city = CITY_WHITESPACE.sub(" ", city.strip())
+        if not 1 <= len(city) <= MAX_CITY_LENGTH:
             await interaction.response.send_message("❌ Invalid city name. Please provide a valid city (1-100 characters).")
             return
         
@@ -389,25 +791,30 @@ async def setlocation(interaction: discord.Interaction, city: str):
             await interaction.followup.send(f"❌ **Error**: Unable to resolve location: `{city}`\nVerify city name and retry.")
             return
         
-        lat, lon = result["lat"], result["lon"]
+        lat, lon = result.lat, result.lon
         tz_str = get_timezone_from_coords(lat, lon)
         local_time = get_local_time(tz_str)
         
-        user_settings[interaction.user.id] = {
-            "city": result["city_name"],
-            "country": result["country"],
-            "lat": lat,
-            "lon": lon,
-            "tz": tz_str,
-            "temp_unit": "celsius",
-            "report_hour": 8
-        }
+        previous = user_settings.get(interaction.user.id)
+        station = Station(
+            city=result.city_name,
+            country=result.country,
+            lat=lat,
+            lon=lon,
+            tz=tz_str,
+        )
+        user_settings[interaction.user.id] = station
         
-        save_user_settings()
+        mark_dirty(interaction.user.id)
+        reschedule_reports(
+            interaction.user.id,
+            (previous.tz, previous.report_hour) if previous else None,
+            (station.tz, station.report_hour)
+        )
         
         embed = discord.Embed(
             title="📍 Observation Station Configured",
-            description=f"Location: **{result['city_name']}, {result['country']}**",
+            description=f"Location: **{result.city_name}, {result.country}**",
             color=0x2C3E50
         )
         embed.add_field(name="Coordinates", value=f"{lat:.4f}°, {lon:.4f}°", inline=True)
@@ -433,33 +840,34 @@ async def atmosphere(interaction: discord.Interaction):
         await interaction.response.defer()
         
         settings = user_settings[interaction.user.id]
-        city = settings["city"]
-        temp_unit = settings.get("temp_unit", "celsius")
+        city = settings.city
+        temp_unit = settings.temp_unit
         
-        data = await get_weather(city)
+        data = await get_weather(city, settings.country)
         if not data:
             await interaction.followup.send("❌ **Data Acquisition Failed**: Unable to retrieve atmospheric data.")
             return
         
         # Calculations
-        dewpoint = calculate_dewpoint(data["temp"], data["humidity"])
-        heat_index = calculate_heat_index(data["temp"], data["humidity"])
-        air_density = calculate_air_density(data["temp"], data["pressure"], data["humidity"])
-        cloud_class, cloud_desc, oktas = classify_clouds_scientific(data["clouds"])
-        cloud_base = calculate_cloud_base_height(data["temp"], dewpoint)
-        wind_dir = cardinal_direction(data["wind_deg"])
-        visibility = get_visibility_category(data["visibility"])
-        local_time = get_local_time(settings["tz"])
+        dewpoint = calculate_dewpoint(data.temp, data.humidity)
+        heat_index = calculate_heat_index(data.temp, data.humidity)
+        air_density = calculate_air_density(data.temp, data.pressure, data.humidity)
+        cloud_class, cloud_desc, oktas = classify_clouds_scientific(data.clouds)
+        cloud_base = calculate_cloud_base_height(data.temp, dewpoint)
+        wind_dir = cardinal_direction(data.wind_deg)
+        visibility = get_visibility_category(data.visibility)
+        local_time = get_local_time(settings.tz)
         
         # Temperature conversions
-        temp, unit_symbol = convert_temperature(data["temp"], temp_unit)
-        feels, _ = convert_temperature(data["feels_like"], temp_unit)
-        hi, _ = convert_temperature(heat_index, temp_unit)
-        dew, _ = convert_temperature(dewpoint, temp_unit)
+        convert, unit_symbol = temperature_converter(temp_unit)
+        temp = convert(data.temp)
+        feels = convert(data.feels_like)
+        hi = convert(heat_index)
+        dew = convert(dewpoint)
         
         # Main embed
         embed = discord.Embed(
-            title=f"🌐 Atmospheric Analysis: {city}, {settings['country']}",
+            title=f"🌐 Atmospheric Analysis: {city}, {settings.country}",
             description=f"**Observation Time**: {local_time}",
             color=0x34495E
         )
@@ -473,14 +881,14 @@ async def atmosphere(interaction: discord.Interaction):
         embed.add_field(name="🌡️ Thermal Conditions", value=temp_data, inline=False)
         
         pressure_data = (
-            f"**Pressure**: {data['pressure']} hPa\n"
-            f"**Relative Humidity**: {data['humidity']}%\n"
+            f"**Pressure**: {data.pressure} hPa\n"
+            f"**Relative Humidity**: {data.humidity}%\n"
             f"**Air Density**: {air_density} kg/m³"
         )
         embed.add_field(name="🔬 Atmospheric Composition", value=pressure_data, inline=False)
         
         cloud_data = (
-            f"**Coverage**: {data['clouds']}% ({oktas}/8 oktas)\n"
+            f"**Coverage**: {data.clouds}% ({oktas}/8 oktas)\n"
             f"**Classification**: {cloud_class}\n"
             f"**Type**: {cloud_desc}\n"
             f"**Estimated Base**: {cloud_base}m AGL"
@@ -488,19 +896,19 @@ async def atmosphere(interaction: discord.Interaction):
         embed.add_field(name="☁️ Nephoanalysis", value=cloud_data, inline=False)
         
         wind_data = (
-            f"**Wind Speed**: {data['wind_speed']} m/s\n"
-            f"**Direction**: {data['wind_deg']}° ({wind_dir})\n"
+            f"**Wind Speed**: {data.wind_speed} m/s\n"
+            f"**Direction**: {data.wind_deg}° ({wind_dir})\n"
             f"**Visibility**: {visibility}"
         )
         embed.add_field(name="💨 Wind & Visibility", value=wind_data, inline=False)
         
         embed.add_field(
             name="📊 Current Conditions",
-            value=f"{data['description'].capitalize()}",
+            value=data.description,
             inline=False
         )
         
-        embed.set_footer(text=f"Data source: OpenWeather API | Station: {settings['lat']:.4f}°, {settings['lon']:.4f}°")
+        embed.set_footer(text=f"Data source: OpenWeather API | Station: {settings.lat:.4f}°, {settings.lon:.4f}°")
         
         await interaction.followup.send(embed=embed)
         
@@ -508,6 +916,12 @@ async def atmosphere(interaction: discord.Interaction):
         logger.error(f"Atmosphere command error: {e}")
         await interaction.followup.send("❌ An error occurred generating the atmospheric report.")
 
+def build_apod_embed(url: str, title: str, explanation: str) -> discord.Embed:
+    """Build the APOD embed shared by /nasa and the daily report"""
+    embed = discord.Embed(title=f"🔭 NASA APOD: {title}", description=explanation, color=NASA_COLOR)
+    embed.set_image(url=url)
+    return embed
+
 @tree.command(name="nasa", description="Retrieve NASA Astronomy Picture of the Day")
 @app_commands.checks.cooldown(1, 60)
 async def nasa(interaction: discord.Interaction):
@@ -519,17 +933,7 @@ async def nasa(interaction: discord.Interaction):
             await interaction.followup.send("❌ **NASA API Error**: Unable to retrieve astronomical image.")
             return
         
-        url, title, explanation = image
-        desc_short = explanation[:500]
-        if len(explanation) > 500:
-            desc_short += "..."
-        
-        embed = discord.Embed(
-            title=f"🔭 NASA APOD: {title}",
-            description=desc_short,
-            color=0x1C1C3C
-        )
-        embed.set_image(url=url)
+        embed = build_apod_embed(*image)
         embed.set_footer(text="Source: NASA Astronomy Picture of the Day")
         
         await interaction.followup.send(embed=embed)
@@ -546,17 +950,17 @@ async def station(interaction: discord.Interaction):
             return
         
         settings = user_settings[interaction.user.id]
-        local_time = get_local_time(settings["tz"])
-        temp_unit = settings.get("temp_unit", "celsius").capitalize()
-        report_hour = settings.get("report_hour", 8)
+        local_time = get_local_time(settings.tz)
+        temp_unit = settings.temp_unit.capitalize()
+        report_hour = settings.report_hour
         
         embed = discord.Embed(
             title="🛰️ Observation Station Status",
             color=0x27AE60
         )
-        embed.add_field(name="Location", value=f"{settings['city']}, {settings['country']}", inline=False)
-        embed.add_field(name="Coordinates", value=f"{settings['lat']:.4f}°, {settings['lon']:.4f}°", inline=True)
-        embed.add_field(name="Timezone", value=f"`{settings['tz']}`", inline=True)
+        embed.add_field(name="Location", value=f"{settings.city}, {settings.country}", inline=False)
+        embed.add_field(name="Coordinates", value=f"{settings.lat:.4f}°, {settings.lon:.4f}°", inline=True)
+        embed.add_field(name="Timezone", value=f"`{settings.tz}`", inline=True)
         embed.add_field(name="Local Time", value=local_time, inline=False)
         embed.add_field(name="Temperature Unit", value=temp_unit, inline=True)
         embed.add_field(name="Report Schedule", value=f"Daily at {report_hour:02d}:00 local time", inline=True)
@@ -592,20 +996,22 @@ async def settings(
         changes = []
         
         if temperature_unit is not None:
-            settings["temp_unit"] = temperature_unit.value
+            settings.temp_unit = temperature_unit.value
             changes.append(f"Temperature unit: **{temperature_unit.name}**")
         
         if report_hour is not None:
             if not 0 <= report_hour <= 23:
                 await interaction.response.send_message("❌ Report hour must be between 0 and 23.")
                 return
-            settings["report_hour"] = report_hour
+            previous_slot = (settings.tz, settings.report_hour)
+            settings.report_hour = report_hour
+            reschedule_reports(interaction.user.id, previous_slot, (settings.tz, report_hour))
             changes.append(f"Daily report time: **{report_hour:02d}:00**")
         
         if not changes:
             # Show current settings
-            temp_unit = settings.get("temp_unit", "celsius").capitalize()
-            rep_hour = settings.get("report_hour", 8)
+            temp_unit = settings.temp_unit.capitalize()
+            rep_hour = settings.report_hour
             
             embed = discord.Embed(
                 title="⚙️ Current Settings",
@@ -617,7 +1023,7 @@ async def settings(
             
             await interaction.response.send_message(embed=embed)
         else:
-            save_user_settings()
+            mark_dirty(interaction.user.id)
             
             embed = discord.Embed(
                 title="✅ Settings Updated",
@@ -630,31 +1036,37 @@ async def settings(
         logger.error(f"Settings command error: {e}")
         await interaction.response.send_message("❌ Error updating settings.")
 
+def build_help_embed() -> discord.Embed:
+    """Build the static command reference embed"""
+    embed = discord.Embed(
+        title="🛰️ Cirrus Uncinus - Command Reference",
+        description="Atmospheric Monitoring System",
+        color=0x3498DB
+    )
+    
+    commands_info = [
+        ("📍 /setlocation", "Configure your observation station location"),
+        ("🌐 /atmosphere", "Get comprehensive atmospheric analysis"),
+        ("🛰️ /station", "View your station configuration"),
+        ("⚙️ /settings", "Configure temperature units and report schedule"),
+        ("🔭 /nasa", "NASA Astronomy Picture of the Day"),
+        ("🏓 /ping", "Check bot status and latency"),
+        ("❓ /help", "Display this help message")
+    ]
+    
+    for cmd, desc in commands_info:
+        embed.add_field(name=cmd, value=desc, inline=False)
+    
+    embed.set_footer(text="Daily reports are sent automatically at your configured time")
+    return embed
+
+# The help content never changes, so it is built once at import
+HELP_EMBED = build_help_embed()
+
 @tree.command(name="help", description="Display all available commands")
 async def help_command(interaction: discord.Interaction):
     try:
-        embed = discord.Embed(
-            title="🛰️ Cirrus Uncinus - Command Reference",
-            description="Atmospheric Monitoring System",
-            color=0x3498DB
-        )
-        
-        commands_info = [
-            ("📍 /setlocation", "Configure your observation station location"),
-            ("🌐 /atmosphere", "Get comprehensive atmospheric analysis"),
-            ("🛰️ /station", "View your station configuration"),
-            ("⚙️ /settings", "Configure temperature units and report schedule"),
-            ("🔭 /nasa", "NASA Astronomy Picture of the Day"),
-            ("🏓 /ping", "Check bot status and latency"),
-            ("❓ /help", "Display this help message")
-        ]
-        
-        for cmd, desc in commands_info:
-            embed.add_field(name=cmd, value=desc, inline=False)
-        
-        embed.set_footer(text="Daily reports are sent automatically at your configured time")
-        
-        await interaction.response.send_message(embed=embed)
+        await interaction.response.send_message(embed=HELP_EMBED)
         
     except Exception as e:
         logger.error(f"Help command error: {e}")
@@ -664,104 +1076,272 @@ async def help_command(interaction: discord.Interaction):
 # SCHEDULED DAILY REPORTS
 # ========================
 
-async def send_daily_report(user_id: int, settings: dict):
-    """Send daily atmospheric report to a user"""
-    try:
-        user = await bot.fetch_user(user_id)
-        city = settings["city"]
-        country = settings["country"]
-        temp_unit = settings.get("temp_unit", "celsius")
+# One cron job per (timezone, report hour) in use, firing at HH:00 local time
+scheduler = AsyncIOScheduler()
+# (timezone, report hour) -> users in that slot, kept in step with user_settings
+schedule_index: dict[tuple[str, int], set[int]] = {}
+# Shared by every report run, so slots firing at the same instant split one budget
+dm_limiter = AsyncLimiter(DM_RATE_LIMIT, 1)
 
-        data = await get_weather(city)
-        if not data:
-            logger.warning(f"Could not fetch weather for daily report: {city}")
-            return
-        
-        # Calculations
-        dewpoint = calculate_dewpoint(data["temp"], data["humidity"])
-        heat_index = calculate_heat_index(data["temp"], data["humidity"])
-        air_density = calculate_air_density(data["temp"], data["pressure"], data["humidity"])
-        cloud_class, cloud_desc, oktas = classify_clouds_scientific(data["clouds"])
-        cloud_base = calculate_cloud_base_height(data["temp"], dewpoint)
-        wind_dir = cardinal_direction(data["wind_deg"])
-        local_time = get_local_time(settings["tz"])
-        
-        # Temperature conversions
-        temp, unit_symbol = convert_temperature(data["temp"], temp_unit)
-        feels, _ = convert_temperature(data["feels_like"], temp_unit)
-        hi, _ = convert_temperature(heat_index, temp_unit)
-        dew, _ = convert_temperature(dewpoint, temp_unit)
-        
-        embed = discord.Embed(
-            title=f"📡 Daily Atmospheric Report: {city}, {country}",
-            description=f"**{local_time}**\n\n*Automated observational data summary*",
-            color=0x2980B9
-        )
-        
-        summary = (
-            f"**Temperature**: {temp}{unit_symbol} (feels like {feels}{unit_symbol})\n"
-            f"**Dewpoint**: {dew}{unit_symbol} | **Heat Index**: {hi}{unit_symbol}\n"
-            f"**Pressure**: {data['pressure']} hPa | **Humidity**: {data['humidity']}%\n"
-            f"**Air Density**: {air_density} kg/m³"
-        )
-        embed.add_field(name="🌡️ Thermodynamic Data", value=summary, inline=False)
-        
-        cloud_summary = (
-            f"**Coverage**: {data['clouds']}% ({oktas}/8 oktas) - {cloud_class}\n"
-            f"**Type**: {cloud_desc}\n"
-            f"**Base Height**: ~{cloud_base}m AGL"
-        )
-        embed.add_field(name="☁️ Cloud Analysis", value=cloud_summary, inline=False)
-        
-        wind_summary = f"**{data['wind_speed']} m/s** from **{wind_dir}** ({data['wind_deg']}°)"
-        embed.add_field(name="💨 Wind Conditions", value=wind_summary, inline=False)
-        
-        embed.add_field(name="📊 Observations", value=data['description'].capitalize(), inline=False)
-        
-        report_hour = settings.get("report_hour", 8)
-        embed.set_footer(text=f"Station: {settings['lat']:.4f}°, {settings['lon']:.4f}° | Next report: {report_hour:02d}:00 tomorrow")
-        
-        await user.send(embed=embed)
-        logger.info(f"Daily report sent to user {user_id}")
+# Report field templates, filled with str.format_map
+REPORT_TITLE_TEMPLATE = "📡 Daily Atmospheric Report: {city}, {country}"
+REPORT_DESCRIPTION_TEMPLATE = "**{local_time}**\n\n*Automated observational data summary*"
+REPORT_FOOTER_TEMPLATE = "Station: {lat:.4f}°, {lon:.4f}° | Next report: {report_hour:02d}:00 tomorrow"
+THERMO_TEMPLATE = (
+    "**Temperature**: {temp}{unit} (feels like {feels_like}{unit})\n"
+    "**Dewpoint**: {dewpoint}{unit} | **Heat Index**: {heat_index}{unit}\n"
+    "{composition}"
+)
+COMPOSITION_TEMPLATE = (
+    "**Pressure**: {pressure} hPa | **Humidity**: {humidity}%\n"
+    "**Air Density**: {air_density} kg/m³"
+)
+CLOUDS_TEMPLATE = (
+    "**Coverage**: {clouds}% ({oktas}/8 oktas) - {cloud_class}\n"
+    "**Type**: {cloud_desc}\n"
+    "**Base Height**: ~{cloud_base}m AGL"
+)
+WIND_TEMPLATE = "**{wind_speed} m/s** from **{wind_dir}** ({wind_deg}°)"
 
-        # NASA Image
-        image = await get_nasa_image()
-        if image:
-            url, title, explanation = image
-            desc_short = explanation[:500]
-            if len(explanation) > 500:
-                desc_short += "..."
-                
-            nasa_embed = discord.Embed(
-                title=f"🔭 NASA APOD: {title}",
-                description=desc_short,
-                color=0x1C1C3C
-            )
-            nasa_embed.set_image(url=url)
-            await user.send(embed=nasa_embed)
-            
-    except discord.Forbidden:
-        logger.warning(f"Cannot send DM to user {user_id} - DMs disabled")
-    except Exception as e:
-        logger.error(f"Report transmission error for user {user_id}: {e}")
+def report_job_id(tz_str: str, report_hour: int) -> str:
+    return f"report:{tz_str}:{report_hour:02d}"
+
+def schedule_report_job(tz_str: str, report_hour: int) -> None:
+    """Register (or refresh) the daily job for a timezone and hour"""
+    scheduler.add_job(
+        send_scheduled_reports,
+        CronTrigger(hour=report_hour, minute=0, timezone=get_tz(tz_str)),
+        args=[tz_str, report_hour],
+        id=report_job_id(tz_str, report_hour),
+        replace_existing=True,
+        coalesce=True,
+        misfire_grace_time=REPORT_MISFIRE_GRACE_SECONDS
+    )
+
+def reschedule_reports(user_id: int, old_slot: tuple[str, int] | None, new_slot: tuple[str, int]) -> None:
+    """Move a user between report slots, adding or dropping slot jobs as they fill or empty"""
+    if old_slot == new_slot:
+        return
+    
+    if old_slot is not None and (members := schedule_index.get(old_slot)) is not None:
+        members.discard(user_id)
+        if not members:
+            del schedule_index[old_slot]
+            scheduler.remove_job(report_job_id(*old_slot))
+    
+    if new_slot not in schedule_index:
+        try:
+            schedule_report_job(*new_slot)
+        except Exception as e:
+            logger.error(f"Cannot schedule reports for {new_slot[0]} {new_slot[1]:02d}:00: {e}")
+            return
+    schedule_index.setdefault(new_slot, set()).add(user_id)
 
-async def check_and_send_reports():
-    """Check all users and send reports if it's their scheduled time"""
-    logger.info("Checking for scheduled reports...")
+def start_report_scheduler() -> None:
+    """Index every user by slot, schedule the slots and start the scheduler"""
     for user_id, settings in user_settings.items():
+        schedule_index.setdefault((settings.tz, settings.report_hour), set()).add(user_id)
+    for tz_str, report_hour in list(schedule_index):
         try:
-            tz_str = settings["tz"]
-            report_hour = settings.get("report_hour", 8)
-            
-            tz = pytz.timezone(tz_str)
-            local_time = datetime.now(tz)
-            
-            # Send if current hour matches report hour (with 5-minute buffer)
-            if local_time.hour == report_hour and local_time.minute < 5:
-                await send_daily_report(user_id, settings)
-                
+            schedule_report_job(tz_str, report_hour)
         except Exception as e:
-            logger.error(f"Error checking report schedule for user {user_id}: {e}")
+            # One unresolvable zone must not keep the bot from starting
+            logger.error(f"Skipping report slot {tz_str} {report_hour:02d}:00: {e}")
+            del schedule_index[tz_str, report_hour]
+    scheduler.start()
+    logger.info(f"⏰ Report scheduler started with {len(scheduler.get_jobs())} job(s)")
+
+def build_city_report(data: Weather, derived: dict) -> dict:
+    """
+    Format the unit-independent parts of a daily report once per city
+    Returns: Shared field strings plus the temperatures each user converts
+    """
+    cloud_class, cloud_desc, oktas = classify_clouds_scientific(data.clouds)
+    wind_dir = cardinal_direction(data.wind_deg)
+    
+    return {
+        "temp": data.temp,
+        "feels_like": data.feels_like,
+        "heat_index": derived["heat_index"],
+        "dewpoint": derived["dewpoint"],
+        "composition": COMPOSITION_TEMPLATE.format_map({
+            "pressure": data.pressure,
+            "humidity": data.humidity,
+            "air_density": derived["air_density"],
+        }),
+        "clouds": CLOUDS_TEMPLATE.format_map({
+            "clouds": data.clouds,
+            "oktas": oktas,
+            "cloud_class": cloud_class,
+            "cloud_desc": cloud_desc,
+            "cloud_base": derived["cloud_base"],
+        }),
+        "wind": WIND_TEMPLATE.format_map({
+            "wind_speed": data.wind_speed,
+            "wind_dir": wind_dir,
+            "wind_deg": data.wind_deg,
+        }),
+        "observations": data.description,
+        # temp_unit -> rendered thermodynamic field, filled on first use
+        "thermo": {},
+    }
+
+def build_daily_embed(settings: Station, report: dict, local_time: str) -> discord.Embed:
+    """Assemble a user's report embed from the shared city fields"""
+    embed = discord.Embed(
+        title=REPORT_TITLE_TEMPLATE.format_map({"city": settings.city, "country": settings.country}),
+        description=REPORT_DESCRIPTION_TEMPLATE.format_map({"local_time": local_time}),
+        color=REPORT_COLOR
+    )
+    # Thermodynamic field is shared by every user of this station with the same unit
+    embed.add_field(name="🌡️ Thermodynamic Data", value=render_thermo_summary(report, settings.temp_unit), inline=False)
+    embed.add_field(name="☁️ Cloud Analysis", value=report["clouds"], inline=False)
+    embed.add_field(name="💨 Wind Conditions", value=report["wind"], inline=False)
+    embed.add_field(name="📊 Observations", value=report["observations"], inline=False)
+    embed.set_footer(text=REPORT_FOOTER_TEMPLATE.format_map({
+        "lat": settings.lat,
+        "lon": settings.lon,
+        "report_hour": settings.report_hour,
+    }))
+    return embed
+
+async def get_report_user(user_id: int) -> discord.User:
+    """Resolve a report recipient from the gateway or user cache before hitting the API"""
+    user = bot.get_user(user_id) or user_cache.get(user_id)
+    if user is None:
+        async with dm_limiter:
+            user = user_cache[user_id] = await bot.fetch_user(user_id)
+    return user
+
+def render_thermo_summary(report: dict, temp_unit: str) -> str:
+    """Render the thermodynamic field once per city report and unit"""
+    summary = report["thermo"].get(temp_unit)
+    if summary is None:
+        convert, unit_symbol = temperature_converter(temp_unit)
+        summary = report["thermo"][temp_unit] = THERMO_TEMPLATE.format_map({
+            "temp": convert(report["temp"]),
+            "feels_like": convert(report["feels_like"]),
+            "dewpoint": convert(report["dewpoint"]),
+            "heat_index": convert(report["heat_index"]),
+            "unit": unit_symbol,
+            "composition": report["composition"],
+        })
+    return summary
+
+async def send_daily_report(user_id: int, settings: Station, report: dict, local_time: str,
+                            nasa_embed: discord.Embed | None):
+    """
+    Send daily atmospheric report to a user
+    Expected delivery failures are logged here; anything else propagates to send_reports
+    """
+    embed = build_daily_embed(settings, report, local_time)
+    embeds = [embed]
+
+    # NASA Image rides along in the same message
+    if nasa_embed is not None:
+        # Discord rejects the whole message past the combined limit; keep the report
+        if len(embed) + len(nasa_embed) <= EMBED_TOTAL_LIMIT:
+            embeds.append(nasa_embed)
+        else:
+            logger.warning(f"Dropping APOD embed for user {user_id}: message would exceed {EMBED_TOTAL_LIMIT} characters")
+    
+    for attempt in range(1, REPORT_SEND_ATTEMPTS + 1):
+        sending = False
+        try:
+            # Each REST call takes its own token; discord.py only caches 128 DM channels
+            user = await get_report_user(user_id)
+            channel = user.dm_channel
+            if channel is None:
+                async with dm_limiter:
+                    channel = await user.create_dm()
+            async with dm_limiter:
+                sending = True
+                await channel.send(embeds=embeds)
+            logger.info(f"Daily report sent to user {user_id}")
+            return
+        
+        except discord.Forbidden:
+            logger.warning(f"Cannot send DM to user {user_id} - DMs disabled")
+            return
+        except discord.HTTPException as e:
+            # discord.py already retried rate limits and server errors
+            logger.warning(f"Discord rejected report for user {user_id}: {e.status} {e.text}")
+            return
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            # The message POST isn't idempotent: past a failed connect, Discord may
+            # already have delivered it, so only the lookups are worth repeating
+            if sending and not isinstance(e, aiohttp.ClientConnectorError):
+                logger.warning(f"Report delivery to user {user_id} unconfirmed, not resending: {e!r}")
+                return
+            if attempt == REPORT_SEND_ATTEMPTS:
+                logger.warning(f"Giving up on report for user {user_id} after {attempt} attempts: {e!r}")
+                return
+            await asyncio.sleep(REPORT_RETRY_DELAY_SECONDS * attempt)
+
+async def send_scheduled_reports(tz_str: str, report_hour: int):
+    """Send reports to every user scheduled for this hour in this timezone"""
+    due = [(user_id, user_settings[user_id]) for user_id in schedule_index.get((tz_str, report_hour), ())]
+    logger.info(f"Sending {len(due)} scheduled report(s) for {tz_str} {report_hour:02d}:00")
+    # Everyone in the slot shares the zone, so resolve and format local time once
+    await send_reports(due, get_local_time(tz_str))
+
+async def send_reports(due: list[tuple[int, Station]], local_time: str):
+    """Fetch, derive and deliver daily reports for a cohort of users"""
+    if not due:
+        return
+    
+    # Fetch each station once, then derive every cohort quantity in one vectorized pass
+    wanted = list({(settings.city, settings.country) for _, settings in due})
+    image, *results = await asyncio.gather(
+        get_nasa_image(),
+        *(get_weather(city, country) for city, country in wanted)
+    )
+    observations = {}
+    for (city, country), data in zip(wanted, results):
+        if data:
+            observations[city, country] = data
+        else:
+            logger.warning(f"Could not fetch weather for daily report: {city}, {country}")
+    
+    if not observations:
+        return
+    
+    # Only distinct (temp, humidity, pressure) readings go through the kernel
+    readings = list(dict.fromkeys((data.temp, data.humidity, data.pressure) for data in observations.values()))
+    columns = {
+        key: values.tolist()
+        for key, values in calculate_derived_batch(
+            *(np.array(column, dtype=float) for column in zip(*readings))
+        ).items()
+    }
+    derived = {
+        reading: {key: column[i] for key, column in columns.items()}
+        for i, reading in enumerate(readings)
+    }
+    reports = {
+        station: build_city_report(data, derived[data.temp, data.humidity, data.pressure])
+        for station, data in observations.items()
+    }
+    
+    # The APOD embed is identical for every recipient, so build it once per run
+    nasa_embed = build_apod_embed(*image) if image else None
+    
+    # A small worker pool drains the recipients; dm_limiter paces the actual sends
+    recipients: asyncio.Queue[tuple[int, Station, dict]] = asyncio.Queue()
+    for user_id, settings in due:
+        if (report := reports.get((settings.city, settings.country))) is not None:
+            recipients.put_nowait((user_id, settings, report))
+    
+    async def send_worker():
+        while not recipients.empty():
+            user_id, settings, report = recipients.get_nowait()
+            try:
+                await send_daily_report(user_id, settings, report, local_time, nasa_embed)
+            except Exception:
+                # One bad report must not stop the batch, but it shouldn't vanish either
+                logger.exception(f"Unexpected report failure for user {user_id}")
+    
+    await asyncio.gather(*(send_worker() for _ in range(min(REPORT_CONCURRENCY, recipients.qsize()))))
 
 # ========================
 # ERROR HANDLERS
@@ -788,21 +1368,21 @@ async def on_app_command_error(interaction: discord.Interaction, error: app_comm
 # EVENTS
 # ========================
 
+@bot.event
+async def setup_hook():
+    # One-time initialisation, before the gateway connects
+    global flush_task
+    get_http_session()
+    await load_user_settings()
+    flush_task = asyncio.create_task(settings_flusher())
+    await start_web_server()
+    start_report_scheduler()
+
 @bot.event
 async def on_ready():
-    load_user_settings()
     await tree.sync()
     logger.info(f"🛰️ Atmospheric Monitoring System initialized: {bot.user}")
     logger.info(f"📡 Stations configured: {len(user_settings)}")
-    
-    # Start scheduler
-    scheduler = AsyncIOScheduler()
-    
-    # Run every 5 minutes to check for reports
-    scheduler.add_job(check_and_send_reports, 'cron', minute='*/5')
-    
-    scheduler.start()
-    logger.info("⏰ Report scheduler started")
 
 @bot.event
 async def on_disconnect():
@@ -817,23 +1397,55 @@ async def on_resumed():
 # ========================
 
 import signal
-import sys
 
-def signal_handler(sig, frame):
-    logger.info("Shutting down gracefully...")
-    save_user_settings()
-    sys.exit(0)
+# Held here because the event loop only keeps weak references to tasks
+close_task: asyncio.Task | None = None
+
+def signal_handler(sig: signal.Signals) -> None:
+    """Close the client so main() unwinds through shutdown() and flushes settings"""
+    global close_task
+    if bot.is_closed() or close_task is not None:
+        return
+    logger.info(f"Received {sig.name}, shutting down gracefully...")
+    close_task = asyncio.create_task(bot.close())
 
-signal.signal(signal.SIGINT, signal_handler)
-signal.signal(signal.SIGTERM, signal_handler)
+def install_signal_handlers() -> None:
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, signal_handler, sig)
+        except NotImplementedError:
+            # Windows event loops: fall back to KeyboardInterrupt handling
+            pass
 
 # ========================
 # INITIALIZE
 # ========================
 
+async def shutdown() -> None:
+    """Release shared resources on exit"""
+    if scheduler.running:
+        scheduler.shutdown(wait=False)
+    await stop_web_server()
+    await close_http_session()
+    await close_database()
+
+async def main() -> None:
+    install_signal_handlers()
+    async with bot:
+        try:
+            await bot.start(BOT_TOKEN)
+        finally:
+            await shutdown()
+
 if __name__ == "__main__":
     try:
-        bot.run(BOT_TOKEN)
+        if uvloop is not None:
+            uvloop.run(main())
+        else:
+            asyncio.run(main())
     except Exception as e:
         logger.critical(f"Fatal error: {e}")
-        save_user_settings()
\ No newline at end of file
+    finally:
+        # Drain queued records before the interpreter exits
+        log_listener.stop()
\ No newline at end of file